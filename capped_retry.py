@@ -0,0 +1,23 @@
+from typing import Optional
+from urllib3.util import Retry
+
+class CappedRetry(Retry):
+    """
+    urllib3 Retry that honors Retry-After headers but never waits longer than
+    retry_after_cap, so a large value cannot park a worker thread for minutes.
+    """
+    def __init__(self, *args, retry_after_cap: Optional[float] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after_cap = retry_after_cap
+
+    def new(self, **kwargs) -> "CappedRetry":
+        # urllib3 copies the Retry object on every attempt; carry the cap over
+        retry = super().new(**kwargs)
+        retry.retry_after_cap = self.retry_after_cap
+        return retry
+
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        if retry_after is not None and self.retry_after_cap is not None:
+            return min(retry_after, self.retry_after_cap)
+        return retry_after
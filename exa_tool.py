@@ -1,7 +1,33 @@
 from smolagents import Tool
 import os
 import json
+import copy
+import threading
+from cachetools import TTLCache
+from singleflight import SingleFlight
 from dotenv import load_dotenv
+from exa_py import Exa
+
+# Load the API key and build the client once when the module is loaded
+load_dotenv()
+api_key = os.getenv("EXA_API_KEY")
+exa_client = Exa(api_key=api_key) if api_key else None
+
+# Search results for the same query are reused for a few hours
+results_cache = TTLCache(maxsize=512, ttl=6 * 3600)
+cache_lock = threading.Lock()
+# Concurrent identical searches share one API call
+in_flight = SingleFlight()
+
+def search(query: str) -> list:
+    response = exa_client.search_and_contents(
+        query,
+        text=True
+    )
+
+    with cache_lock:
+        results_cache[query] = response.results
+    return response.results
 
 class ExaTool(Tool):
     name = "exa_search"
@@ -17,19 +43,15 @@ class ExaTool(Tool):
     output_type = "array"
 
     def forward(self, query: str) -> list:
-        load_dotenv()
-        api_key = os.getenv("EXA_API_KEY")
-        if not api_key:
+        if exa_client is None:
             raise ValueError("EXA_API_KEY not found.")
 
-        from exa_py import Exa
-
-        exa = Exa(api_key=api_key)
-        response = exa.search_and_contents(
-            query,
-            text=True
-        )
-
-        return response.results
+        # Results are mutable objects and the agent's code may modify what it gets back,
+        # so every caller (cache hit, leader or follower) receives its own copy of the cached list
+        with cache_lock:
+            cached = results_cache.get(query)
+        if cached is None:
+            cached = in_flight.do(query, search, query)
+        return copy.deepcopy(cached)
 
 exa_search = ExaTool()
\ No newline at end of file
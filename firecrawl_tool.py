@@ -1,11 +1,73 @@
 from smolagents import Tool
 import os
+import re
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from singleflight import SingleFlight
 from dotenv import load_dotenv
+from firecrawl import FirecrawlApp
+
+# Load the API key and build the client once when the module is loaded
+load_dotenv()
+api_key = os.getenv("FIRECRAWL_API_KEY")
+firecrawl_app = FirecrawlApp(api_key=api_key) if api_key else None
+
+logger = logging.getLogger(__name__)
+
+# Site content changes more often than search indexes, so keep crawls for an hour
+crawl_cache = TTLCache(maxsize=256, ttl=3600)
+cache_lock = threading.Lock()
+# Concurrent requests for the same site share one set of scrapes
+in_flight = SingleFlight()
+
+# Pages are trimmed before reaching the LLM: images carry no useful text and long pages blow up the context
+MAX_PAGE_CHARS = 4000
+IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+
+# Pages are scraped concurrently instead of waiting for Firecrawl to crawl them one after another
+MAX_PAGES = 8
+executor = ThreadPoolExecutor(max_workers=MAX_PAGES, thread_name_prefix="firecrawl")
+
+def compact_markdown(markdown: str) -> str:
+    return IMAGE_PATTERN.sub("", markdown)[:MAX_PAGE_CHARS]
+
+def site_urls(url: str) -> list:
+    # Discover pages via Firecrawl's map endpoint; the entry URL always comes first
+    result = firecrawl_app.map_url(url, params={'limit': MAX_PAGES})
+    links = result.get('links', []) if isinstance(result, dict) else result or []
+    urls = [url] + [link for link in links if link != url]
+    return urls[:MAX_PAGES]
+
+def scrape_markdown(url: str):
+    try:
+        result = firecrawl_app.scrape_url(url, params={'formats': ['markdown']})
+    except Exception as e:
+        # firecrawl-py 1.x raises requests errors for HTTP/network failures and a bare Exception
+        # when the API reports success=false; anything else (e.g. an SDK mismatch) is a real bug
+        if not isinstance(e, requests.exceptions.RequestException) and type(e) is not Exception:
+            raise
+        # One failing page should not discard the rest of the site
+        logger.warning("Firecrawl scrape failed for %s: %s", url, e)
+        return None
+    return result.get('markdown')
+
+def scrape_site(url: str) -> list:
+    markdowns = executor.map(scrape_markdown, site_urls(url))
+    pages = [compact_markdown(markdown) for markdown in markdowns if markdown]
+    if not pages:
+        # Every scrape failed (e.g. rate limit or outage); report it instead of caching an empty site
+        raise RuntimeError(f"Firecrawl could not scrape any page of {url}.")
+    with cache_lock:
+        crawl_cache[url] = pages
+    return pages
 
 class FirecrawlCrawlTool(Tool):
     name = "firecrawl_crawl"
     description = """
-    This tool crawls up to eight pages of a given website using the Firecrawl API and returns the markdown content of each crawled page as a list.
+    This tool scrapes up to eight pages of a given website using the Firecrawl API and returns the markdown content of each crawled page (images removed, truncated to 4000 characters) as a list.
     """
     inputs = {
         "url": {
@@ -16,23 +78,14 @@ class FirecrawlCrawlTool(Tool):
     output_type = "array"
 
     def forward(self, url: str) -> list:
-        load_dotenv()
-        api_key = os.getenv("FIRECRAWL_API_KEY")
-        if not api_key:
+        if firecrawl_app is None:
             raise ValueError("FIRECRAWL_API_KEY not found.")
 
-        from firecrawl import FirecrawlApp
-
-        app = FirecrawlApp(api_key=api_key)
-        crawl_status = app.crawl_url(
-            url,
-            params={
-                'limit': 8,
-                'scrapeOptions': {'formats': ['markdown']}
-            },
-            poll_interval=30
-        )
-        data = crawl_status.get('data', [])
-        return [item['markdown'] for item in data if 'markdown' in item]
+        # The agent's code may modify the list it gets back, so callers never receive the cached object itself
+        with cache_lock:
+            cached = crawl_cache.get(url)
+        if cached is None:
+            cached = in_flight.do(url, scrape_site, url)
+        return list(cached)
 
 firecrawl_crawl_tool = FirecrawlCrawlTool()
\ No newline at end of file
@@ -0,0 +1,14 @@
+import multiprocessing
+import os
+
+# Run with: gunicorn main:app
+# Each worker imports main.py itself (preload_app stays off), so the HTTP sessions,
+# caches and thread pools created at import time are never shared across forks.
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2))
+# uvicorn.workers is deprecated; the worker now lives in the uvicorn-worker package
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Agent runs can take several minutes per lead
+timeout = 300
+keepalive = 5
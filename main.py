@@ -2,31 +2,113 @@ from smolagents import CodeAgent, OpenAIServerModel
 from exa_tool import ExaTool
 from firecrawl_tool import FirecrawlCrawlTool
 from teams_tool import TeamsNotificationTool
-from similarweb_tools import SimilarWebGeneralDataTool
+from similarweb_tools import SimilarWebGeneralDataTool, SimilarWebBundleTool
 import textwrap
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
 import uvicorn
+import httpx
+import logging
+import logging.handlers
 import os
+import queue
+import contextvars
+from contextlib import asynccontextmanager
+import uuid
 from dotenv import load_dotenv
-from openai import OpenAI
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Id of the HTTP request being handled; stamped on every log record emitted in its context
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Request threads only enqueue log records; a background listener does the stderr I/O.
+    # Started per worker process so it survives Gunicorn forks.
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    # prepare() bakes the QueueHandler's formatting into record.msg, so it must pass the
+    # message through unchanged and leave the real format to the listener's handler
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    # Filters run in the emitting thread, where the request's context (and id) is visible
+    queue_handler.addFilter(RequestIdFilter())
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler], force=True)
+    listener.start()
+    try:
+        yield
+    finally:
+        listener.stop()
+
+# One pooled HTTP client shared by every agent run; the SDK default pool is too small for concurrent leads
+http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    timeout=httpx.Timeout(120.0, connect=5.0)
+)
+
 model = OpenAIServerModel(
     model_id="gpt-4.1",
-    api_key=os.getenv("OPENAI_API_KEY")
+    api_key=os.getenv("OPENAI_API_KEY"),
+    client_kwargs={"http_client": http_client}
 )
 
-agent = CodeAgent(tools=[TeamsNotificationTool(), SimilarWebGeneralDataTool(), ExaTool(), FirecrawlCrawlTool()], model=model)
+# similarweb_general_data covers the PV calculation in one paid call; similarweb_bundle is there for when the
+# agent also wants technographics and lead enrichment, fetched concurrently in a single tool hop
+tools = [TeamsNotificationTool(), SimilarWebGeneralDataTool(), SimilarWebBundleTool(), ExaTool(), FirecrawlCrawlTool()]
+
+def build_agent():
+    # CodeAgent keeps per-run memory, so concurrent requests each get their own instance
+    return CodeAgent(tools=tools, model=model)
 
 class PromptInput(BaseModel):
+    # Oversized prompts are rejected with a 422 before they reach the agent (and the token bill)
+    model_config = ConfigDict(extra="ignore", str_max_length=32_000)
+
     prompt: str
 
-app = FastAPI()
+# OpenAPI schema and docs are only served when explicitly enabled (e.g. in development)
+enable_docs = os.getenv("ENABLE_API_DOCS", "").lower() in ("1", "true", "yes")
 
-def get_system_prompt():
-  my_string = """\
+app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+    docs_url="/docs" if enable_docs else None,
+    redoc_url="/redoc" if enable_docs else None,
+    openapi_url="/openapi.json" if enable_docs else None
+)
+
+@app.middleware("http")
+async def add_request_id(request: Request, call_next):
+    # Propagate the caller's request id, or mint one, so a lead can be traced through the logs
+    # (threadpool work such as the agent run inherits the id; the tools' own worker pools log it as '-')
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.get("/healthz", response_class=ORJSONResponse)
+async def healthz():
+    # Cheap liveness probe that never touches the agent; async so it is answered on the event loop
+    # instead of queueing behind agent runs in the threadpool
+    return {"ok": True}
+
+SYSTEM_PROMPT = textwrap.dedent("""\
 You are a lead generation specialist at Ptmind, a marketing technology firm that provides the web analytics and heat map solution Ptengine. Most of the firm's business comes from Japan.
 
 There is an interest form on our website where sales leads can fill out their name (required), email (required), telephone number (optional), and company name (optional).
@@ -78,18 +160,21 @@ Finally, use the final_answer tool to directly output the results as well.
 
 
 New interest form submitted:
-"""
-  return textwrap.dedent(my_string).strip()
+""").strip()
+
+# Built once at import; each request only appends the user prompt
+PROMPT_PREFIX = SYSTEM_PROMPT + "\n\n"
 
-@app.post("/process_lead/")
+@app.post("/process_lead/", response_class=ORJSONResponse)
 async def process_lead(input_data: PromptInput):
     user_prompt = input_data.prompt
 
     try:
-        agent.run(get_system_prompt() + "\n\n" + user_prompt)
+        # agent.run blocks for minutes; run it in the threadpool to keep the event loop free
+        await run_in_threadpool(build_agent().run, PROMPT_PREFIX + user_prompt)
         return {"message": "Processing initiated successfully with provided prompt."}
     except Exception as e:
-        print(f"Error processing prompt: {e}")
+        logger.exception("Error processing prompt")
         raise HTTPException(status_code=500, detail=f"Failed to process prompt: {str(e)}")
 
 if __name__ == "__main__":
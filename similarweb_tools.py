@@ -1,18 +1,137 @@
 from smolagents import Tool
 import requests
+from requests.adapters import HTTPAdapter
+from capped_retry import CappedRetry
 import os
 from dotenv import load_dotenv
 import logging
-from datetime import datetime
-import json
+import re
+import orjson
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from singleflight import SingleFlight
 
-# Configure logging (optional but recommended)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Handlers are configured by the host application (see main.py)
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file once when the module is loaded
 load_dotenv()
 api_key = os.getenv('SIMILARWEB_API_KEY')
 
+# Shared session so repeated calls to api.similarweb.com reuse pooled keep-alive connections.
+# raise_on_status=False hands the final response to raise_for_status() once retries run out.
+# Retry-After is honored but capped, and every call has a timeout, so a throttled or hung request
+# cannot hold an executor thread (and its single-flight followers) indefinitely.
+session = requests.Session()
+session.headers.update({'accept': 'application/json'})
+session.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=CappedRetry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False, retry_after_cap=10.0)
+))
+REQUEST_TIMEOUT = (3.05, 30) # (connect, read) seconds per attempt
+
+# SimilarWeb data is monthly, so successful responses are cached for a day.
+# TTLCache is not thread-safe and tools may run concurrently, hence the lock.
+response_cache = TTLCache(maxsize=1024, ttl=86400)
+cache_lock = threading.Lock()
+# Identical requests issued concurrently (e.g. several leads from one company) share one API call
+in_flight = SingleFlight()
+
+# Shared worker pool for fanning out SimilarWeb calls; reuses threads (and their pooled connections) across leads
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="similarweb")
+
+# Dates are validated with a precompiled pattern rather than datetime.strptime
+YEAR_MONTH_PATTERN = re.compile(r'\d{4}-(0[1-9]|1[0-2])')
+
+# Technographics entries are reduced to these fields before being returned to the LLM
+TECHNOGRAPHICS_FIELDS = ('technology_name', 'category', 'sub_category')
+
+def project_technologies(data):
+    """
+    Reduces each technographics entry to TECHNOGRAPHICS_FIELDS.
+    Up to 1000 entries come back with descriptions and metadata the LLM does not need.
+    """
+    if isinstance(data, dict) and isinstance(data.get('technologies'), list):
+        data['technologies'] = [
+            {field: tech[field] for field in TECHNOGRAPHICS_FIELDS if field in tech}
+            for tech in data['technologies']
+        ]
+    return data
+
+def similarweb_get(tool_name: str, path: str, domain: str, params: dict, transform=None) -> str:
+    """
+    Performs a cached GET request against the SimilarWeb API using the shared session.
+
+    Args:
+        tool_name: Name of the calling tool, used in log messages.
+        path: The endpoint path, e.g. 'v1/website/jp.ptmind.com/general-data/all'.
+        domain: The website domain being queried, used in log and error messages.
+        params: Query parameters for the endpoint, excluding the API key.
+        transform: Optional callable applied to the decoded JSON before it is serialized.
+
+    Returns:
+        A compact JSON formatted string containing the API response, or an error message string.
+    """
+    if not api_key:
+        error_msg = "Error: SIMILARWEB_API_KEY not found in environment variables or .env file."
+        logger.error(error_msg)
+        return error_msg # Return the error message as a string
+
+    cache_key = (path,) + tuple(params.items())
+    with cache_lock:
+        cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    return in_flight.do(cache_key, fetch_similarweb, tool_name, path, domain, params, transform, cache_key)
+
+def fetch_similarweb(tool_name: str, path: str, domain: str, params: dict, transform, cache_key) -> str:
+    """
+    Performs the uncached GET request for similarweb_get and stores successful results in the cache.
+    """
+    logger.info("Tool '%s': Requesting data for domain '%s' (%s)", tool_name, domain, path)
+
+    try:
+        # Make the GET request
+        response = session.get(f"https://api.similarweb.com/{path}", params={'api_key': api_key, **params}, timeout=REQUEST_TIMEOUT)
+
+        # Check for HTTP errors (e.g., 401, 403, 404, 429)
+        response.raise_for_status()
+
+        # Parse the JSON response
+        data = response.json()
+        logger.info("Tool '%s': Successfully retrieved data for %s", tool_name, domain)
+
+        if transform is not None:
+            data = transform(data)
+
+        # Compact JSON keeps the payload (and the LLM's token count) small
+        result = orjson.dumps(data).decode()
+        with cache_lock:
+            response_cache[cache_key] = result
+        return result
+
+    except requests.exceptions.JSONDecodeError:
+        # Handle cases where the response is not valid JSON.
+        # JSONDecodeError subclasses RequestException, so it must be caught first.
+        logger.error("Error: Failed to decode JSON response for %s.", domain)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response text: %s", response.text)
+        # Return a descriptive error string
+        return f"Error: Invalid JSON response received from API for '{domain}'."
+
+    except requests.exceptions.RequestException as e:
+        # Handle connection errors, timeouts, HTTP errors, etc.
+        status_code = getattr(e.response, 'status_code', 'N/A')
+        logger.error("Error: API request failed for %s. Status: %s. Details: %s", domain, status_code, e)
+        # Error bodies can be large (e.g. during 429 storms), so only format them when debugging
+        if e.response is not None and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response text: %s", e.response.text)
+        # Return a descriptive error string
+        return f"Error: API request failed for '{domain}'. Status code: {status_code}."
+
 class SimilarWebLeadEnrichmentTool(Tool):
     """
     A smolagents Tool to fetch lead enrichment data from the SimilarWeb API.
@@ -53,24 +172,13 @@ class SimilarWebLeadEnrichmentTool(Tool):
         Returns:
             A JSON formatted string containing the API response, or an error message string.
         """
-        if not api_key:
-            error_msg = "Error: SIMILARWEB_API_KEY not found in environment variables or .env file."
-            logging.error(error_msg)
-            return error_msg # Return the error message as a string
-
         # Basic date format validation
-        try:
-            datetime.strptime(start_date, '%Y-%m')
-            datetime.strptime(end_date, '%Y-%m')
-        except ValueError:
+        if not (YEAR_MONTH_PATTERN.fullmatch(start_date) and YEAR_MONTH_PATTERN.fullmatch(end_date)):
             error_msg = "Error: Invalid date format. Please use 'YYYY-MM'."
-            logging.error(error_msg)
+            logger.error(error_msg)
             return error_msg # Return the error message as a string
 
-        # Construct the API URL and parameters
-        api_url = f"https://api.similarweb.com/v1/website/{domain}/lead-enrichment/all"
         params = {
-            'api_key': api_key,
             'start_date': start_date,
             'end_date': end_date,
             'country': 'world',
@@ -78,49 +186,7 @@ class SimilarWebLeadEnrichmentTool(Tool):
             'format': 'json',
             'show_verified': 'false'
         }
-        headers = {
-            'accept': 'application/json'
-        }
-
-        logging.info(f"Tool '{self.name}': Requesting data for domain '{domain}' ({start_date} to {end_date})")
-
-        try:
-            # Make the GET request
-            response = requests.get(api_url, headers=headers, params=params)
-
-            # Check for HTTP errors (e.g., 401, 404, 429)
-            response.raise_for_status()
-
-            # Parse the JSON response
-            data = response.json()
-            logging.info(f"Tool '{self.name}': Successfully retrieved data for {domain}")
-
-            # Return the data as a nicely formatted JSON string
-            return json.dumps(data, indent=2)
-
-        except requests.exceptions.RequestException as e:
-            # Handle connection errors, timeouts, HTTP errors, etc.
-            status_code = getattr(e.response, 'status_code', 'N/A')
-            response_text = getattr(e.response, 'text', 'No response text available')
-            error_msg = f"Error: API request failed for {domain}. Status: {status_code}. Details: {e}"
-            logging.error(error_msg)
-            logging.error(f"Response text (if available): {response_text}")
-            # Return a descriptive error string
-            return f"Error: API request failed for '{domain}'. Status code: {status_code}."
-
-        except requests.exceptions.JSONDecodeError:
-            # Handle cases where the response is not valid JSON
-            error_msg = f"Error: Failed to decode JSON response for {domain}. Response text: {response.text}"
-            logging.error(error_msg)
-            # Return a descriptive error string
-            return f"Error: Invalid JSON response received from API for '{domain}'."
-
-        except Exception as e:
-            # Catch any other unexpected errors
-            error_msg = f"Error: An unexpected error occurred while processing request for {domain}: {e}"
-            logging.error(error_msg)
-            # Return a descriptive error string
-            return f"Error: An unexpected error occurred for '{domain}'."
+        return similarweb_get(self.name, f"v1/website/{domain}/lead-enrichment/all", domain, params)
 
 # Instantiate the tool for use
 similarweb_lead_enrichment_tool = SimilarWebLeadEnrichmentTool()
@@ -134,7 +200,7 @@ class SimilarWebTechnographicsTool(Tool):
     name = "similarweb_technographics"
     description = """
     Calls the SimilarWeb Technographics API (v4) for a given domain.
-    Retrieves a list of technologies detected on the website.
+    Retrieves a list of technologies detected on the website (name, category and sub-category).
     Returns the list as a JSON formatted string. Requires the domain name as input.
     """
     inputs = {
@@ -159,62 +225,12 @@ class SimilarWebTechnographicsTool(Tool):
             A JSON formatted string containing the API response (list of technologies),
             or an error message string.
         """
-        if not api_key:
-            error_msg = "Error: SIMILARWEB_API_KEY not found in environment variables or .env file."
-            logging.error(error_msg)
-            return error_msg # Return the error message as a string
-
-        # Construct the API URL and parameters
         # Using the v4 endpoint as specified
-        api_url = f"https://api.similarweb.com/v4/website/{domain}/technographics/all"
         params = {
-            'api_key': api_key,
             'format': 'json',
             'limit': 1000 # Hardcoded limit based on the example URL
         }
-        headers = {
-            'accept': 'application/json'
-        }
-
-        logging.info(f"Tool '{self.name}': Requesting technographics data for domain '{domain}'")
-
-        try:
-            # Make the GET request
-            response = requests.get(api_url, headers=headers, params=params)
-
-            # Check for HTTP errors (e.g., 401, 403, 404, 429)
-            response.raise_for_status()
-
-            # Parse the JSON response
-            data = response.json()
-            logging.info(f"Tool '{self.name}': Successfully retrieved technographics for {domain}")
-
-            # Return the data as a nicely formatted JSON string
-            return json.dumps(data, indent=2)
-
-        except requests.exceptions.RequestException as e:
-            # Handle connection errors, timeouts, HTTP errors, etc.
-            status_code = getattr(e.response, 'status_code', 'N/A')
-            response_text = getattr(e.response, 'text', 'No response text available')
-            error_msg = f"Error: API request failed for {domain}. Status: {status_code}. Details: {e}"
-            logging.error(error_msg)
-            logging.error(f"Response text (if available): {response_text}")
-            # Return a descriptive error string
-            return f"Error: API request failed for '{domain}'. Status code: {status_code}."
-
-        except requests.exceptions.JSONDecodeError:
-            # Handle cases where the response is not valid JSON
-            error_msg = f"Error: Failed to decode JSON response for {domain}. Response text: {response.text}"
-            logging.error(error_msg)
-            # Return a descriptive error string
-            return f"Error: Invalid JSON response received from API for '{domain}'."
-
-        except Exception as e:
-            # Catch any other unexpected errors
-            error_msg = f"Error: An unexpected error occurred while processing request for {domain}: {e}"
-            logging.error(error_msg)
-            # Return a descriptive error string
-            return f"Error: An unexpected error occurred for '{domain}'."
+        return similarweb_get(self.name, f"v4/website/{domain}/technographics/all", domain, params, transform=project_technologies)
 
 # Instantiate the tool for use
 similarweb_technographics_tool = SimilarWebTechnographicsTool()
@@ -252,61 +268,74 @@ class SimilarWebGeneralDataTool(Tool):
             A JSON formatted string containing the API response (general website data),
             or an error message string.
         """
-        if not api_key:
-            error_msg = "Error: SIMILARWEB_API_KEY not found in environment variables or .env file."
-            logging.error(error_msg)
-            return error_msg # Return the error message as a string
-
-        # Construct the API URL and parameters
         # Using the v1 endpoint as specified
-        api_url = f"https://api.similarweb.com/v1/website/{domain}/general-data/all"
         params = {
-            'api_key': api_key,
             'format': 'json',
         }
-        headers = {
-            'accept': 'application/json'
+        return similarweb_get(self.name, f"v1/website/{domain}/general-data/all", domain, params)
+
+# Instantiate the tool for use
+similarweb_general_data_tool = SimilarWebGeneralDataTool()
+
+
+
+class SimilarWebBundleTool(Tool):
+    """
+    A smolagents Tool that fetches lead enrichment, technographics and general data
+    from the SimilarWeb API concurrently and merges them into one result.
+    """
+    name = "similarweb_bundle"
+    description = """
+    Calls the SimilarWeb Lead Enrichment, Technographics and General Data APIs for a given domain in parallel.
+    Requires domain, start_date (YYYY-MM), and end_date (YYYY-MM) as input.
+    Start and end date must be at most 11 months apart.
+    Returns a JSON formatted string with 'lead_enrichment', 'technographics' and 'general_data' keys.
+    Individual sections contain an error message string if that API call failed.
+    """
+    inputs = {
+        "domain": {
+            "type": "string",
+            "description": "The website domain to query (e.g., 'jp.ptmind.com').",
+        },
+        "start_date": {
+            "type": "string",
+            "description": "The start date for the lead enrichment data range in 'YYYY-MM' format (e.g., '2024-04').",
+        },
+        "end_date": {
+            "type": "string",
+            "description": "The end date for the lead enrichment data range in 'YYYY-MM' format (e.g., '2025-03'). MUST be at most 11 months after the start date!",
+        },
+    }
+    output_type = "string"
+
+    def forward(self, domain: str, start_date: str, end_date: str) -> str:
+        """
+        Executes the three SimilarWeb API calls concurrently.
+
+        Args:
+            domain: The website domain to query.
+            start_date: The start date in 'YYYY-MM' format.
+            end_date: The end date in 'YYYY-MM' format.
+
+        Returns:
+            A JSON formatted string containing the merged API responses.
+        """
+        # Each call mostly waits on the network, so total latency is the slowest call rather than the sum
+        futures = {
+            "lead_enrichment": executor.submit(similarweb_lead_enrichment_tool.forward, domain, start_date, end_date),
+            "technographics": executor.submit(similarweb_technographics_tool.forward, domain),
+            "general_data": executor.submit(similarweb_general_data_tool.forward, domain),
         }
+        results = {key: future.result() for key, future in futures.items()}
 
-        logging.info(f"Tool '{self.name}': Requesting general data for domain '{domain}'")
-
-        try:
-            # Make the GET request
-            response = requests.get(api_url, headers=headers, params=params)
-
-            # Check for HTTP errors (e.g., 401, 403, 404, 429)
-            response.raise_for_status()
-
-            # Parse the JSON response
-            data = response.json()
-            logging.info(f"Tool '{self.name}': Successfully retrieved general data for {domain}")
-
-            # Return the data as a nicely formatted JSON string
-            return json.dumps(data, indent=2)
-
-        except requests.exceptions.RequestException as e:
-            # Handle connection errors, timeouts, HTTP errors, etc.
-            status_code = getattr(e.response, 'status_code', 'N/A')
-            response_text = getattr(e.response, 'text', 'No response text available')
-            error_msg = f"Error: API request failed for {domain}. Status: {status_code}. Details: {e}"
-            logging.error(error_msg)
-            logging.error(f"Response text (if available): {response_text}")
-            # Return a descriptive error string
-            return f"Error: API request failed for '{domain}'. Status code: {status_code}."
-
-        except requests.exceptions.JSONDecodeError:
-            # Handle cases where the response is not valid JSON
-            error_msg = f"Error: Failed to decode JSON response for {domain}. Response text: {response.text}"
-            logging.error(error_msg)
-            # Return a descriptive error string
-            return f"Error: Invalid JSON response received from API for '{domain}'."
-
-        except Exception as e:
-            # Catch any other unexpected errors
-            error_msg = f"Error: An unexpected error occurred while processing request for {domain}: {e}"
-            logging.error(error_msg)
-            # Return a descriptive error string
-            return f"Error: An unexpected error occurred for '{domain}'."
+        merged = {}
+        for key, result in results.items():
+            try:
+                merged[key] = orjson.loads(result)
+            except ValueError:
+                # Error messages are plain strings; pass them through as-is
+                merged[key] = result
+        return orjson.dumps(merged).decode()
 
 # Instantiate the tool for use
-similarweb_general_data_tool = SimilarWebGeneralDataTool()
\ No newline at end of file
+similarweb_bundle_tool = SimilarWebBundleTool()
\ No newline at end of file
@@ -0,0 +1,34 @@
+import threading
+from concurrent.futures import Future
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for it and receive the same result (or exception).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # Evict on completion; later callers go through the response caches instead
+            with self._lock:
+                del self._calls[key]
\ No newline at end of file
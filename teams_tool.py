@@ -1,13 +1,24 @@
 import json
+import gzip
 import logging
 import requests
-from typing import Any, Dict, Optional
+from requests.adapters import HTTPAdapter
+from capped_retry import CappedRetry
+from typing import Any, Dict, List, Optional
 from dataclasses import dataclass
+from types import MappingProxyType
+import concurrent.futures
+import threading
 import time
-from requests.exceptions import RequestException, Timeout
+from requests.exceptions import RequestException
 import os
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError: # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
 load_dotenv()
 
 # --- Re-included code from the original script ---
@@ -16,19 +27,23 @@ load_dotenv()
 @dataclass
 class TeamsConfig:
     webhook_url: str = os.getenv("TEAMS_WEBHOOK_URL")
-    timeout: int = 30
+    connect_timeout: float = 3.0 # Unreachable webhooks fail fast instead of holding a worker
+    read_timeout: float = 15.0
     max_retries: int = 3
-    retry_delay: int = 10
-
-# Logging Setup (optional within the tool, but good practice)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-    ]
-)
-logger = logging.getLogger("TeamsNotificationTool")
+    retry_delay: int = 10 # No longer used; kept for compatibility
+    retry_base: float = 0.5 # urllib3 backoff_factor (and jitter): sleeps ~retry_base * 2**retry seconds
+    retry_cap: float = 30.0 # Upper bound for a single backoff sleep, including Retry-After waits
+    ack_timeout: float = 2.0 # How long the tool waits for the send before reporting it as queued
+    compress_body: bool = False # Opt-in gzip request bodies (Teams does not document gzip support); turned off per sender if the webhook rejects them
+    breaker_threshold: int = 5 # Consecutive failed sends before the circuit opens
+    breaker_cooldown_s: float = 60.0 # How long an open circuit rejects sends before one is let through again
+
+# Logging Setup: handlers and levels are left to the host application (see main.py)
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Sends run here so a slow or retrying webhook does not hold up the agent
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="teams")
 
 # Input Validation Helper
 def validate_and_convert_to_string(value: Any, field_name: str) -> str:
@@ -36,6 +51,9 @@ def validate_and_convert_to_string(value: Any, field_name: str) -> str:
     Validate if the value can be converted to a string, and return the string representation.
     If None, return empty string. If conversion fails, raise ValueError.
     """
+    # Fast path: every tool input is declared as a string, so this is the common case
+    if type(value) is str:
+        return value
     if value is None:
         return ""
     try:
@@ -49,182 +67,257 @@ def validate_and_convert_to_string(value: Any, field_name: str) -> str:
     except Exception as e:
         raise ValueError(f"Tool input field '{field_name}' must be convertible to a string. Value: {repr(value)}. Error: {str(e)}")
 
+# Shared read-only default for missing card sections
+EMPTY = MappingProxyType({})
+
+# JSON Encoding Helper
+def dumps_payload(payload: Dict) -> bytes:
+    """Encode a payload as compact UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# Adaptive Card Skeleton
+# Identical for every notification, so built once. These are shared between payloads and must not be mutated;
+# only the per-card body/actions/msteams containers are created fresh in _build_payload.
+CARD_CONTENT_BASE = {
+    "type": "AdaptiveCard",
+    "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+    "version": "1.2"
+}
+CARD_HEADER = {
+    "type": "TextBlock",
+    "size": "Large",
+    "weight": "Bolder",
+    "text": "New Lead - User Sign up (via Research Agent)",
+    "isSubtle": True
+}
+
+# Adaptive Card Helpers
+def text_block(text: str) -> Dict:
+    return {"type": "TextBlock", "text": text, "wrap": True}
+
+def label_row(label: str, items: list, label_width: str = "80px") -> Dict:
+    """
+    Build the two-column row used throughout the card: a bold label on the left
+    and the value items on the right.
+    """
+    return {"type": "ColumnSet", "columns": [
+        {"type": "Column", "width": label_width, "items": [{"type": "TextBlock", "text": label, "weight": "Bolder", "size": "Medium", "wrap": True}]},
+        {"type": "Column", "width": "stretch", "items": items}
+    ]}
+
+def strip_spaces(text: str) -> str:
+    """Remove spaces from a URL, returning the input unchanged (no copy) when it has none."""
+    return text.replace(" ", "") if " " in text else text
+
+# Rows that show one field (plus optional follow-up fields) under a label, per card section:
+# (label, field, extra fields appended as further text blocks). Order matches the card layout.
+USER_FIELD_ROWS = (
+    ("職位情報", "position", ("other_position",)),
+    ("備考情報", "note", ("tags",)),
+    ("個人観点", "perspective", ()),
+)
+COMPANY_FIELD_ROWS = (
+    ("競合事例", "pte_tags", ()),
+    ("類似顧客", "similar_customers", ()),
+    ("問合せ", "form_message", ()),
+)
+EVALUATION_FIELD_ROWS = (
+    ("推定MRR", "estimated_mrr", ()),
+    ("加点要素", "positive_factors", ()),
+    ("減点要素", "negative_factors", ()),
+)
+
+def field_rows(section, specs) -> List[Dict]:
+    """Build a label_row for each spec whose field is set in section."""
+    rows = []
+    for label, field, extra_fields in specs:
+        value = section.get(field)
+        if value:
+            items = [text_block(value)]
+            for extra_field in extra_fields:
+                extra = section.get(extra_field)
+                if extra:
+                    items.append(text_block(extra))
+            rows.append(label_row(label, items))
+    return rows
+
+# Star counts for the usual lead_rating values ("★★★" or "★★★☆☆"); other strings fall back to counting
+RATING_STARS = {**{"★" * n: n for n in range(1, 6)}, **{"★" * n + "☆" * (5 - n): n for n in range(1, 6)}}
+
 # Teams Notification Class (copied directly)
 class TeamsNotification:
     def __init__(self, config: TeamsConfig):
         self.config = config
-        self.headers = {"Content-Type": "application/json"}
+        self.headers = {"Content-Type": "application/json; charset=utf-8"}
+        self.gzip_headers = {**self.headers, "Content-Encoding": "gzip"}
+        # Cleared after the first 400/415 answer to a compressed body, so later sends go out plain
+        self.compress_body = config.compress_body
+        # Pooled keep-alive session; the adapter's urllib3 Retry handles retries, backoff
+        # with jitter and Retry-After (capped at retry_cap) for timeouts, connection errors, 429 and 5xx.
+        # max_retries counts attempts, so the first try is not a retry.
+        retry = CappedRetry(
+            total=max(config.max_retries - 1, 0),
+            backoff_factor=config.retry_base,
+            backoff_max=config.retry_cap,
+            backoff_jitter=config.retry_base,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+            retry_after_cap=config.retry_cap
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry))
+        # Circuit breaker state: during a webhook outage sends fail immediately instead of
+        # each one spending the full timeout and retry budget
+        self.breaker_lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False # Set while the single half-open trial send is running
 
     def send_notification(self, card_data: Optional[Dict] = None) -> Dict:
         try:
             payload = self._build_payload(card_data)
             return self._send_with_retry(payload)
         except Exception as e:
-            logger.error(f"Error building or sending notification: {str(e)}")
+            logger.error("Error building or sending notification: %s", e)
             return {"status": "Failure", "detail": f"Internal tool error: {str(e)}"}
 
     def _build_payload(self, card_data: Optional[Dict]) -> Dict:
+        return {"type": "message", "attachments": [self._build_attachment(card_data)]}
+
+    def _build_attachment(self, card_data: Optional[Dict]) -> Dict:
         if card_data is None:
             card_data = {}
-
-        # Base Payload - Adaptive Card Structure
-        payload = {
-            "type": "message",
-            "attachments": [
-                {
-                    "contentType": "application/vnd.microsoft.card.adaptive",
-                    "content": {
-                        "type": "AdaptiveCard",
-                        "body": [
-                            {
-                                "type": "TextBlock",
-                                "size": "Large",
-                                "weight": "Bolder",
-                                "text": "New Lead - User Sign up (via Research Agent)",
-                                "isSubtle": True
-                            }
-                        ],
-                        "actions": [
-                             {
-                                "type": "Action.OpenUrl",
-                                "title": "Source Info (if available)",
-                                "url": card_data.get("source_url", "https://app.kocoro.ai/")
-                            },
-                             # Add more generic actions or make them dynamic if needed
-                        ],
-                        "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
-                        "version": "1.2",
-                        "msteams": {
-                            "width": "Full",
-                            "entities": [] # Initialize entities for mentions
-                        }
-                    }
+        # Bind the nested sections once instead of re-walking card_data for every field
+        user = card_data.get("user") or EMPTY
+        company = card_data.get("company") or EMPTY
+        image = card_data.get("image") or EMPTY
+        evaluation_data = card_data.get("evaluation") or EMPTY
+        company_image = image.get("company") or EMPTY
+        # Values used by more than one row are looked up (and formatted) once
+        user_name = user.get("name")
+        website = company.get("website")
+        website_md = f"[{website}]({website})" if website else None
+        last_month_pv = evaluation_data.get("last_month_pv")
+
+        # Base Attachment - Adaptive Card Structure (static parts are shared module constants)
+        attachment = {
+            "contentType": "application/vnd.microsoft.card.adaptive",
+            "content": {
+                **CARD_CONTENT_BASE,
+                "body": [CARD_HEADER],
+                "actions": [
+                    {
+                        "type": "Action.OpenUrl",
+                        "title": "Source Info (if available)",
+                        "url": card_data.get("source_url", "https://app.kocoro.ai/")
+                    },
+                    # Add more generic actions or make them dynamic if needed
+                ],
+                "msteams": {
+                    "width": "Full",
+                    "entities": [] # Initialize entities for mentions
                 }
-            ]
+            }
         }
+        body = attachment["content"]["body"]
         # --- Dynamically add sections based on card_data ---
         # (Keeping the logic exactly the same as the original script)
 
         # Company Name/Logo Section
-        if card_data.get("company", {}).get("name") or card_data.get("image", {}).get("company", {}).get("url"):
+        if company.get("name") or company_image.get("url"):
             company_column_set = {"type": "ColumnSet", "columns": [], "style": "emphasis"}
-            if card_data.get("company", {}).get("name"):
+            if company.get("name"):
                 company_column_set["columns"].append({
                     "type": "Column", "width": "stretch", "items": [{
-                        "type": "TextBlock", "text": card_data["company"]["name"], "wrap": True, "size": "ExtraLarge"
+                        "type": "TextBlock", "text": company["name"], "wrap": True, "size": "ExtraLarge"
                     }], "horizontalAlignment": "Left", "verticalContentAlignment": "Center"
                 })
-            if card_data.get("image", {}).get("company", {}).get("url"):
+            if company_image.get("url"):
                 company_column_set["columns"].append({
                     "type": "Column", "width": "stretch", "items": [{
-                        "type": "Image", "url": card_data["image"]["company"]["url"], "height": "100px",
-                        "horizontalAlignment": "Right", "altText": card_data["image"]["company"].get("name", "") + "_logo"
+                        "type": "Image", "url": company_image["url"], "height": "100px",
+                        "horizontalAlignment": "Right", "altText": company_image.get("name", "") + "_logo"
                     }]
                 })
-            payload["attachments"][0]["content"]["body"].append(company_column_set)
+            body.append(company_column_set)
 
         # User Info Section
-        if card_data.get("user", {}).get("name"):
+        if user_name:
             user_column_set = {
                 "type": "ColumnSet", "columns": [
-                    {"type": "Column", "items": [{"type": "Image", "url": card_data.get("image", {}).get("user", {}).get("url", "https://i.imgur.com/Nho5TnJb.jpg"), "altText": card_data["user"]["name"], "spacing": "None", "horizontalAlignment": "Left", "size": "Medium", "style": "Person", "width": "80px"}], "width": "80px", "verticalContentAlignment": "Top"},
-                    {"type": "Column", "items": [{"type": "TextBlock", "weight": "Bolder", "size": "Large", "text": card_data["user"]["name"], "wrap": True}], "width": "stretch"}
+                    {"type": "Column", "items": [{"type": "Image", "url": (image.get("user") or EMPTY).get("url", "https://i.imgur.com/Nho5TnJb.jpg"), "altText": user_name, "spacing": "None", "horizontalAlignment": "Left", "size": "Medium", "style": "Person", "width": "80px"}], "width": "80px", "verticalContentAlignment": "Top"},
+                    {"type": "Column", "items": [{"type": "TextBlock", "weight": "Bolder", "size": "Large", "text": user_name, "wrap": True}], "width": "stretch"}
                 ], "separator": True
             }
-            payload["attachments"][0]["content"]["body"].append(user_column_set)
+            body.append(user_column_set)
 
             # User Contact Info (Phone/Email) - Appended to the second column of user info
             user_contact_info = {"type": "Container", "items": []}
-            if card_data["user"].get("phone"):
-                phone_column_set = {"type": "ColumnSet", "columns": [{"type": "Column", "width": "50px", "items": [{"type": "TextBlock", "text": "電話", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": card_data["user"]["phone"], "wrap": True}]}]}
-                user_contact_info["items"].append(phone_column_set)
-            if card_data["user"].get("email"):
-                email_column_set = {"type": "ColumnSet", "columns": [{"type": "Column", "width": "50px", "items": [{"type": "TextBlock", "text": "メール", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": card_data["user"]["email"], "wrap": True}]}]}
-                user_contact_info["items"].append(email_column_set)
+            if user.get("phone"):
+                user_contact_info["items"].append(label_row("電話", [text_block(user["phone"])], label_width="50px"))
+            if user.get("email"):
+                user_contact_info["items"].append(label_row("メール", [text_block(user["email"])], label_width="50px"))
             if user_contact_info["items"]:
                 # Find the user_column_set we just added and append contact info to its second column's items
                 user_column_set_index = -1 # It's the last item added to body so far
-                payload["attachments"][0]["content"]["body"][user_column_set_index]["columns"][1]["items"].append(user_contact_info)
+                body[user_column_set_index]["columns"][1]["items"].append(user_contact_info)
 
         # User Additional Info Section
-        user_additional_info = {"type": "Container", "items": []}
-        # Position
-        if card_data.get("user", {}).get("position"):
-            position_items = [{"type": "TextBlock", "text": card_data["user"]["position"], "wrap": True}]
-            if card_data["user"].get("other_position"):
-                position_items.append({"type": "TextBlock", "text": card_data["user"]["other_position"], "wrap": True})
-            user_additional_info["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "職位情報", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": position_items}]})
-        # Note/Tags
-        if card_data.get("user", {}).get("note"):
-            note_items = [{"type": "TextBlock", "text": card_data["user"]["note"], "wrap": True}]
-            if card_data["user"].get("tags"):
-                note_items.append({"type": "TextBlock", "text": card_data["user"]["tags"], "wrap": True})
-            user_additional_info["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "備考情報", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": note_items}]})
-        # Perspective
-        if card_data.get("user", {}).get("perspective"):
-             user_additional_info["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "個人観点", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": card_data["user"]["perspective"], "wrap": True}]}]})
+        # Position, Note/Tags, Perspective
+        user_additional_info = {"type": "Container", "items": field_rows(user, USER_FIELD_ROWS)}
         if user_additional_info["items"]:
-            payload["attachments"][0]["content"]["body"].append(user_additional_info)
+            body.append(user_additional_info)
 
         # Company Details Section
         company_details = {"type": "Container", "items": []}
         # Website
-        if card_data.get("company", {}).get("website"):
-             website_items = [{"type": "TextBlock", "text": f"[{card_data['company']['website']}]({card_data['company']['website']})", "wrap": True}]
-             if card_data["company"].get("webpage_info"):
-                 website_items.append({"type": "TextBlock", "text": card_data["company"]["webpage_info"], "wrap": True})
-             if card_data["company"].get("webpage_tags"):
-                 website_items.append({"type": "TextBlock", "text": card_data["company"]["webpage_tags"], "wrap": True})
-             company_details["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "サイト", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": website_items}]})
+        if website:
+            website_items = [text_block(website_md)]
+            if company.get("webpage_info"):
+                website_items.append(text_block(company["webpage_info"]))
+            if company.get("webpage_tags"):
+                website_items.append(text_block(company["webpage_tags"]))
+            company_details["items"].append(label_row("サイト", website_items))
         # Company Info/Industry/Size/Tech
-        if card_data.get("company", {}).get("info"):
-             info_items = [{"type": "TextBlock", "text": card_data["company"]["info"], "wrap": True}]
-             if card_data["company"].get("employee_range"):
-                 info_items.append({"type": "TextBlock", "text": f"社員規模：{card_data['company']['employee_range']}", "wrap": True})
-             industry_tags = " ".join(filter(None, [card_data["company"].get("industry"), card_data["company"].get("tags")]))
-             if industry_tags:
-                 info_items.append({"type": "TextBlock", "text": industry_tags, "wrap": True})
-             if card_data["company"].get("technology_name"):
-                 info_items.append({"type": "TextBlock", "text": f"会社サイト採用技術: {card_data['company']['technology_name']}", "wrap": True})
-             company_details["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "会社情報", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": info_items}]})
-        # PTE Tags
-        if card_data.get("company", {}).get("pte_tags"):
-             company_details["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "競合事例", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": card_data["company"]["pte_tags"], "wrap": True}]}]})
-        # Similar Customers
-        if card_data.get("company", {}).get("similar_customers"):
-            company_details["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "類似顧客", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": card_data["company"]["similar_customers"], "wrap": True}]}]})
-        # Form Message
-        if card_data.get("company", {}).get("form_message"):
-            company_details["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "問合せ", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": card_data["company"]["form_message"], "wrap": True}]}]})
+        if company.get("info"):
+            info_items = [text_block(company["info"])]
+            if company.get("employee_range"):
+                info_items.append(text_block(f"社員規模：{company['employee_range']}"))
+            industry_tags = " ".join(filter(None, [company.get("industry"), company.get("tags")]))
+            if industry_tags:
+                info_items.append(text_block(industry_tags))
+            if company.get("technology_name"):
+                info_items.append(text_block(f"会社サイト採用技術: {company['technology_name']}"))
+            company_details["items"].append(label_row("会社情報", info_items))
+        # PTE Tags, Similar Customers, Form Message
+        company_details["items"].extend(field_rows(company, COMPANY_FIELD_ROWS))
         if company_details["items"]:
-            payload["attachments"][0]["content"]["body"].append(company_details)
+            body.append(company_details)
 
         # Lead Evaluation Section
         lead_evaluation = {"type": "Container", "items": [], "bleed": True}
-        evaluation_data = card_data.get("evaluation", {})
         # Rating / Style
         if evaluation_data.get("lead_rating"):
-             stars_count = evaluation_data["lead_rating"].count("★")
-             if stars_count >= 4:
-                 lead_evaluation["style"] = "warning"
-             lead_evaluation["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "リード評価", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": evaluation_data["lead_rating"], "wrap": True}]}]})
+            rating = evaluation_data["lead_rating"]
+            stars_count = RATING_STARS.get(rating)
+            if stars_count is None:
+                stars_count = rating.count("★")
+            if stars_count >= 4:
+                lead_evaluation["style"] = "warning"
+            lead_evaluation["items"].append(label_row("リード評価", [text_block(rating)]))
         # PV
-        if evaluation_data.get("last_month_pv") and card_data.get("company", {}).get("website"):
-            pv_text = f"{evaluation_data['last_month_pv']} ([{card_data['company']['website']}]({card_data['company']['website']}))"
-            lead_evaluation["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "先月PV", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": pv_text, "wrap": True}]}]})
-        elif evaluation_data.get("last_month_pv"): # PV without website link
-             lead_evaluation["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "先月PV", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": str(evaluation_data['last_month_pv']), "wrap": True}]}]})
-        # MRR
-        if evaluation_data.get("estimated_mrr"):
-             lead_evaluation["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "推定MRR", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": evaluation_data["estimated_mrr"], "wrap": True}]}]})
-        # Positive Factors
-        if evaluation_data.get("positive_factors"):
-             lead_evaluation["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "加点要素", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": evaluation_data["positive_factors"], "wrap": True}]}]})
-        # Negative Factors
-        if evaluation_data.get("negative_factors"):
-             lead_evaluation["items"].append({"type": "ColumnSet", "columns": [{"type": "Column", "width": "80px", "items": [{"type": "TextBlock", "text": "減点要素", "weight": "Bolder", "size": "Medium", "wrap": True}]}, {"type": "Column", "width": "stretch", "items": [{"type": "TextBlock", "text": evaluation_data["negative_factors"], "wrap": True}]}]})
+        if last_month_pv and website:
+            lead_evaluation["items"].append(label_row("先月PV", [text_block(f"{last_month_pv} ({website_md})")]))
+        elif last_month_pv: # PV without website link
+            lead_evaluation["items"].append(label_row("先月PV", [text_block(str(last_month_pv))]))
+        # MRR, Positive Factors, Negative Factors
+        lead_evaluation["items"].extend(field_rows(evaluation_data, EVALUATION_FIELD_ROWS))
         if lead_evaluation["items"]:
-            payload["attachments"][0]["content"]["body"].append(lead_evaluation)
+            body.append(lead_evaluation)
 
         # Mention Handling
         mention = card_data.get("mention", {})
@@ -240,54 +333,96 @@ class TeamsNotification:
                 "mentioned": {"id": mention_email, "name": mention_name}
             }
             # Append mention text to body and entity to msteams entities
-            payload["attachments"][0]["content"]["body"].append(mention_text_block)
-            payload["attachments"][0]["content"]["msteams"]["entities"].append(mention_entity)
+            body.append(mention_text_block)
+            attachment["content"]["msteams"]["entities"].append(mention_entity)
 
-
-        return payload
+        return attachment
 
     def _send_with_retry(self, payload: Dict) -> Dict:
-        """带重试机制的发送请求"""
-        for attempt in range(self.config.max_retries):
-            try:
-                response = requests.post(
-                    self.config.webhook_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=self.config.timeout
-                )
-                response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-
-                # Teams webhook usually returns '1' on success
-                if response.status_code == 200 and response.text == "1":
-                    logger.info("Notification sent successfully.")
-                    return {"status": "Success", "detail": "Notification sent successfully."}
+        """带重试机制的发送请求, short-circuited while the breaker is open"""
+        probe = False
+        with self.breaker_lock:
+            if self.consecutive_failures >= self.config.breaker_threshold:
+                # Open: reject until the cooldown has passed, then let exactly one trial send through
+                if self.probe_in_flight or time.monotonic() - self.opened_at < self.config.breaker_cooldown_s:
+                    return {"status": "Failure", "detail": "circuit open"}
+                self.probe_in_flight = probe = True
+
+        outage = True
+        try:
+            result, outage = self._post(payload)
+        finally:
+            with self.breaker_lock:
+                if probe:
+                    self.probe_in_flight = False
+                if not outage:
+                    # The webhook answered (even if it rejected this payload), so it is reachable
+                    self.consecutive_failures = 0
                 else:
-                    # Handle unexpected success response
-                    logger.warning(f"Sent notification but received unexpected response. Status: {response.status_code}, Body: {response.text[:500]}")
-                    # Still treat as success if status is 200 OK
-                    if response.status_code == 200:
-                         return {"status": "Success", "detail": f"Notification sent, but response was not '1' (Status: {response.status_code})."}
-                    else: # Should be caught by raise_for_status, but as fallback
-                         return {"status": "Failure", "detail": f"Sending failed with status: {response.status_code}, Response: {response.text[:200]}"}
-
-
-            except Timeout:
-                logger.warning(f"Request timed out on attempt {attempt + 1}/{self.config.max_retries}.")
-                if attempt == self.config.max_retries - 1:
-                    return {"status": "Failure", "detail": "Request timed out after multiple retries."}
-            except RequestException as e:
-                logger.error(f"Request failed on attempt {attempt + 1}/{self.config.max_retries}: {str(e)}")
-                if attempt == self.config.max_retries - 1:
-                    return {"status": "Failure", "detail": f"Request failed after multiple retries: {str(e)}"}
-
-            # Wait before retrying only if it wasn't the last attempt
-            if attempt < self.config.max_retries - 1:
-                 logger.info(f"Waiting {self.config.retry_delay} seconds before retry...")
-                 time.sleep(self.config.retry_delay)
-
-        # Should theoretically not be reached if logic above is correct, but as safety
-        return {"status": "Failure", "detail": "Reached max retries without success."}
+                    self.consecutive_failures += 1
+                    if self.consecutive_failures >= self.config.breaker_threshold:
+                        # (Re)open the circuit; after the cooldown a single trial send is let through
+                        self.opened_at = time.monotonic()
+                        logger.warning("Teams webhook failed %d times in a row; pausing sends for %ss.", self.consecutive_failures, self.config.breaker_cooldown_s)
+        return result
+
+    def _post(self, payload: Dict) -> tuple:
+        """
+        Send the payload once at the Python level (retries are performed by the session adapter).
+        Returns (result, outage) where outage marks transport errors, 429 and 5xx for the circuit breaker.
+        """
+        # Serialize (and compress) once; retries resend the same bytes (requests sets Content-Length for bytes bodies)
+        body = dumps_payload(payload)
+        compress = self.compress_body
+        try:
+            if compress:
+                status_code, head = self._request(gzip.compress(body, compresslevel=1), self.gzip_headers)
+                if status_code in (400, 415):
+                    # The encoding was rejected; resend once as plain JSON. 429/5xx are outages for the breaker
+                    logger.info("Teams webhook rejected a gzip body (status %s); sending uncompressed from now on.", status_code)
+                    compress = self.compress_body = False
+            if not compress:
+                status_code, head = self._request(body, self.headers)
+        except RequestException as e:
+            # Timeouts land here too: once the adapter's retries run out, a read timeout
+            # surfaces as ConnectionError (MaxRetryError) rather than Timeout
+            logger.error("Request failed after %d attempts: %s", self.config.max_retries, e)
+            return {"status": "Failure", "detail": f"Request failed after multiple retries: {str(e)}"}, True
+        head_text = head.decode("utf-8", errors="replace")
+
+        # Teams webhook usually returns '1' on success
+        if status_code == 200 and head == b"1":
+            logger.info("Notification sent successfully.")
+            return {"status": "Success", "detail": "Notification sent successfully."}, False
+        elif status_code == 200:
+            # Handle unexpected success response, still treated as success
+            logger.warning("Sent notification but received unexpected response. Status: %s, Body: %s", status_code, head_text)
+            return {"status": "Success", "detail": f"Notification sent, but response was not '1' (Status: {status_code})."}, False
+        else:
+            # Non-retriable status, or retries exhausted on 429/5xx
+            logger.error("Sending failed with status: %s, Body: %s", status_code, head_text)
+            outage = status_code == 429 or status_code >= 500
+            return {"status": "Failure", "detail": f"Sending failed with status: {status_code}, Response: {head_text[:200]}"}, outage
+
+    def _request(self, data: bytes, headers: Dict) -> tuple:
+        """POST data to the webhook and return (status code, first bytes of the response body)"""
+        response = self.session.post(
+            self.config.webhook_url,
+            headers=headers,
+            data=data,
+            timeout=(self.config.connect_timeout, self.config.read_timeout),
+            stream=True
+        )
+        try:
+            # Only the first bytes matter for the '1' check; large error pages are never read in full.
+            # Short bodies are read to EOF, which returns the connection to the pool before close().
+            head = response.raw.read(512, decode_content=True)
+        finally:
+            response.close()
+        return response.status_code, head
+
+# Shared sender built once from the environment; forward() reuses it for every notification
+default_sender = TeamsNotification(TeamsConfig())
 
 # --- End of Re-included code ---
 
@@ -380,26 +515,52 @@ class TeamsNotificationTool(Tool):
         Executes the tool: validates inputs, builds the data structure,
         and sends the notification via TeamsNotification class.
         """
-        logger.info(f"Received request to send notification for company: {LeadCompanyName or 'N/A'}")
+        logger.info("Received request to send notification for company: %s", LeadCompanyName or 'N/A')
         data = {}
         try:
-            # Validate and collect all inputs
-            input_params = locals() # Get all local variables including args
-            # Exclude 'self' from validation
-            input_params.pop('self', None)
-
-            for key, value in input_params.items():
-                 # Skip validation for parameters not in the tool's defined inputs (like logger, internal vars)
-                 if key in self.inputs:
-                      data[key] = validate_and_convert_to_string(value, key)
+            # Validate and collect all inputs, listed explicitly rather than reflected from locals()
+            input_params = (
+                ("LeadCompanyName", LeadCompanyName),
+                ("CompanyInfo_Short", CompanyInfo_Short),
+                ("userEmail", userEmail),
+                ("userName", userName),
+                ("UserInfo_Short", UserInfo_Short),
+                ("UserTitle_ThisCompany", UserTitle_ThisCompany),
+                ("PersonalOpinionPreference", PersonalOpinionPreference),
+                ("Top5Cases_Name", Top5Cases_Name),
+                ("account_phone", account_phone),
+                ("Image_URL_companyLogo", Image_URL_companyLogo),
+                ("LeadScoreLevel", LeadScoreLevel),
+                ("ReasonforPrioritization", ReasonforPrioritization),
+                ("ReasonforDeprioritization", ReasonforDeprioritization),
+                ("LastMonthPV", LastMonthPV),
+                ("potential_mrr", potential_mrr),
+                ("refinedURL", refinedURL),
+                ("technology_name", technology_name),
+                ("formMessage", formMessage),
+                ("UserTitle_OtherCompany", UserTitle_OtherCompany),
+                ("CompanyIndustry", CompanyIndustry),
+                ("employee_range", employee_range),
+                ("UserTags", UserTags),
+                ("CompanyTags", CompanyTags),
+                ("WebPageTags", WebPageTags),
+                ("WebPageInfo_Short", WebPageInfo_Short),
+                ("PTECompetitorCaseStudyTags", PTECompetitorCaseStudyTags),
+                ("Image_URL_userPhoto", Image_URL_userPhoto),
+                ("mention_name", mention_name),
+                ("mention_email", mention_email),
+                ("source_url", source_url),
+            )
+            for key, value in input_params:
+                data[key] = validate_and_convert_to_string(value, key)
 
             # Specific cleanup for URLs (remove spaces) - applied *after* validation
-            data["Image_URL_companyLogo"] = data.get("Image_URL_companyLogo", "").replace(" ", "")
-            data["refinedURL"] = data.get("refinedURL", "").replace(" ", "")
-            data["Image_URL_userPhoto"] = data.get("Image_URL_userPhoto", "").replace(" ", "")
+            data["Image_URL_companyLogo"] = strip_spaces(data.get("Image_URL_companyLogo", ""))
+            data["refinedURL"] = strip_spaces(data.get("refinedURL", ""))
+            data["Image_URL_userPhoto"] = strip_spaces(data.get("Image_URL_userPhoto", ""))
 
         except ValueError as e:
-            logger.error(f"Input validation failed: {str(e)}")
+            logger.error("Input validation failed: %s", e)
             return f"Input validation failed: {str(e)}" # Return error message directly
 
         # Structure the data for the Adaptive Card payload builder
@@ -436,11 +597,17 @@ class TeamsNotificationTool(Tool):
 
         # Send the notification using the TeamsNotification class
         try:
-            config = TeamsConfig() # Uses the hardcoded URL defined above
-            notification_sender = TeamsNotification(config)
-            result = notification_sender.send_notification(card_data=custom_data)
+            future = executor.submit(default_sender.send_notification, card_data=custom_data)
+            try:
+                result = future.result(timeout=default_sender.config.ack_timeout)
+            except concurrent.futures.TimeoutError:
+                # Still retrying; let it finish in the background and log the outcome then
+                future.add_done_callback(
+                    lambda f: logger.info("Background notification finished with status: %s", f.result().get('status'))
+                )
+                return "Notification queued; it is still being sent in the background."
 
-            logger.info(f"Notification attempt finished with status: {result.get('status')}")
+            logger.info("Notification attempt finished with status: %s", result.get('status'))
             # Return the detail message regardless of precise success check ('1')
             # The agent just needs to know if it broadly succeeded or failed.
             return result.get("detail", "Notification status unknown.")